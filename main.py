@@ -1,22 +1,67 @@
 import asyncio
+import logging
 import os
-import pydantic
-import psycopg2
+import queue
+import random
+import sys
+import psycopg
+from psycopg.conninfo import conninfo_to_dict, make_conninfo
+from psycopg.rows import class_row
+from psycopg_pool import AsyncConnectionPool
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-import json
+from uuid import UUID
 from dotenv import load_dotenv
-import schedule
-import time
-from typing import List, Optional
+from logging.handlers import QueueHandler, QueueListener
+from typing import Awaitable, Dict, List, Optional
 import aiohttp
-import asyncio
 import re
 
+try:
+    # Faster libuv-based event loop; not available on Windows
+    import uvloop
+except ImportError:
+    uvloop = None
+
 # Load environment variables
 load_dotenv()
 
-class ScheduledTask(pydantic.BaseModel):
-    id: str
+logger = logging.getLogger(__name__)
+
+def parse_int_setting(value: str, minimum: int = 1) -> Optional[int]:
+    """Return value as an integer of at least minimum, or None if it isn't one"""
+    try:
+        number = int(value)
+    except ValueError:
+        return None
+    return number if number >= minimum else None
+
+# Settings read once at import, after load_dotenv(); main() validates them
+DATABASE_URL = os.environ.get("DATABASE_URL")
+BROWSER_USE_API_KEY = os.environ.get("BROWSER_USE_API_KEY")
+MAX_PARALLEL_TASKS_SETTING = os.environ.get("MAX_PARALLEL_TASKS", "5")
+MAX_PARALLEL_TASKS = parse_int_setting(MAX_PARALLEL_TASKS_SETTING)
+DB_POOL_MAX_SETTING = os.environ.get("DB_POOL_MAX", "8")
+DB_POOL_MAX = parse_int_setting(DB_POOL_MAX_SETTING)
+# Runs of a statement on one connection before psycopg prepares it
+# server-side; "off" disables prepared statements (see DatabaseManager)
+DB_PREPARE_THRESHOLD_SETTING = os.environ.get("DB_PREPARE_THRESHOLD", "1")
+DB_PREPARE_THRESHOLD_OFF = DB_PREPARE_THRESHOLD_SETTING.lower() in ("off", "none", "")
+DB_PREPARE_THRESHOLD = None if DB_PREPARE_THRESHOLD_OFF else parse_int_setting(DB_PREPARE_THRESHOLD_SETTING, minimum=0)
+
+# Longest the daemon sleeps between checks, so new tasks are still picked up
+# if the NOTIFY trigger from migrations/ is not installed
+DAEMON_MAX_IDLE_SECONDS = 300
+DAEMON_RETRY_SECONDS = 5
+
+# Upper bound for closing a pool, session or listener during shutdown
+SHUTDOWN_TIMEOUT_SECONDS = 10
+
+# Rows come straight from our own table with known column types, so a plain
+# dataclass is built per row instead of a validated pydantic model
+@dataclass(slots=True, frozen=True)
+class ScheduledTask:
+    id: UUID
     user_id: str
     task_name: str
     query: str
@@ -26,123 +71,210 @@ class ScheduledTask(pydantic.BaseModel):
     is_active: bool
     created_at: datetime
     updated_at: datetime
+    # schedule parsed by the database query, so it is never re-parsed in Python
+    schedule_interval: Optional[timedelta] = None
 
 class DatabaseManager:
+    # libpq TCP settings used unless DATABASE_URL already sets them, so dead or
+    # NAT-dropped connections are detected quickly instead of hanging
+    CONNECTION_DEFAULTS = {
+        "keepalives": "1",
+        "keepalives_idle": "30",
+        "keepalives_interval": "10",
+        "tcp_user_timeout": "30000",
+    }
+    
+    # Channel the scheduled_tasks trigger notifies when tasks are added or changed
+    NOTIFY_CHANNEL = "scheduled_tasks_changed"
+    
+    # Active tasks joined with their schedule parsed into an interval.
+    # Schedules look like "every 30 minutes"; the number is extracted once per
+    # row, a missing number falls back to 1 hour / 30 minutes / 1 day, and
+    # anything unrecognised runs hourly. Intervals are floored at one minute
+    # (e.g. "every 0 minutes"), which the claim query's index bound relies on.
+    # All digits are joined, so a long run like "(since 2024-01-01)" is clamped
+    # at 10^8 (effectively never due) rather than overflowing the int cast and
+    # failing the query for every task.
+    TASKS_WITH_INTERVAL_SQL = """
+        scheduled_tasks t
+        CROSS JOIN LATERAL (
+            SELECT CASE
+                WHEN d.digits <> '' THEN LEAST(d.digits::numeric, 100000000)::int
+            END AS amount
+            FROM (SELECT regexp_replace(t.schedule, '\\D', '', 'g') AS digits) d
+        ) p
+        CROSS JOIN LATERAL (
+            SELECT GREATEST(
+                CASE
+                    WHEN t.schedule !~* 'every' THEN INTERVAL '1 hour'
+                    WHEN t.schedule ~* 'hour' THEN COALESCE(p.amount, 1) * INTERVAL '1 hour'
+                    WHEN t.schedule ~* 'minute' THEN COALESCE(p.amount, 30) * INTERVAL '1 minute'
+                    WHEN t.schedule ~* 'day' THEN COALESCE(p.amount, 1) * INTERVAL '1 day'
+                    ELSE INTERVAL '1 hour'
+                END,
+                INTERVAL '1 minute'
+            ) AS schedule_interval
+        ) s
+    """
+    
     def __init__(self, database_url: str):
         self.database_url = database_url
+        self.conninfo = self._build_conninfo(database_url)
+        # Keep connections open between queries instead of reconnecting each time.
+        # The pool is async so queries don't block the event loop while tasks run.
+        self.pool = AsyncConnectionPool(
+            self.conninfo,
+            min_size=1,
+            max_size=DB_POOL_MAX,
+            # Statements repeated on a pooled connection (every daemon tick)
+            # skip re-parsing and re-planning from their second run. Set
+            # DB_PREPARE_THRESHOLD=off behind poolers without prepared statement
+            # support, such as PgBouncer in transaction mode before 1.21.
+            kwargs={"prepare_threshold": DB_PREPARE_THRESHOLD},
+            open=False
+        )
     
-    def get_connection(self):
-        return psycopg2.connect(self.database_url)
+    def _build_conninfo(self, database_url: str) -> str:
+        """Add keepalive and statement timeout defaults to the connection string"""
+        params = conninfo_to_dict(database_url)
+        for key, value in self.CONNECTION_DEFAULTS.items():
+            params.setdefault(key, value)
+        
+        # Bound runaway queries server-side; DB_STATEMENT_TIMEOUT_MS=0 disables it
+        statement_timeout = os.environ.get("DB_STATEMENT_TIMEOUT_MS", "5000")
+        options = params.get("options", "")
+        if statement_timeout != "0" and "statement_timeout" not in options:
+            params["options"] = f"{options} -c statement_timeout={statement_timeout}".strip()
+        
+        return make_conninfo(**params)
     
-    def get_tasks_due_for_execution(self) -> List[ScheduledTask]:
-        """Get all active tasks that are due for execution based on their schedule"""
-        conn = self.get_connection()
-        try:
-            with conn.cursor() as cursor:
-                # Get all active tasks
-                cursor.execute("""
-                    SELECT id, user_id, task_name, query, data_structure, schedule, 
-                           last_run_at, is_active, created_at, updated_at
-                    FROM scheduled_tasks 
-                    WHERE is_active = true
-                """)
-                
-                tasks = []
-                for row in cursor.fetchall():
-                    task = ScheduledTask(
-                        id=row[0],
-                        user_id=row[1],
-                        task_name=row[2],
-                        query=row[3],
-                        data_structure=row[4],
-                        schedule=row[5],
-                        last_run_at=row[6],
-                        is_active=row[7],
-                        created_at=row[8],
-                        updated_at=row[9]
+    async def open(self):
+        """Open the pool and wait for its first connection"""
+        await self.pool.open(wait=True)
+    
+    async def close(self):
+        """Close all pooled connections"""
+        await self.pool.close()
+    
+    async def current_time(self) -> datetime:
+        """The database's current time, which last_run_at is stamped with"""
+        async with self.pool.connection() as conn:
+            cursor = await conn.execute("SELECT NOW()")
+            row = await cursor.fetchone()
+            return row[0]
+    
+    async def claim_due_tasks(self, limit: int, due_by: datetime, exclude_ids: List[UUID]) -> List[ScheduledTask]:
+        """Claim up to limit tasks that were due by due_by, skipping exclude_ids, by setting their last_run_at"""
+        async with self.pool.connection() as conn:
+            async with conn.cursor(row_factory=class_row(ScheduledTask)) as cursor:
+                # Lock the due rows and stamp last_run_at in one statement.
+                # SKIP LOCKED lets several runners claim disjoint tasks instead of
+                # double-executing them, and failed tasks are stamped too, so
+                # they aren't retried on every tick. The returned last_run_at is
+                # the previous run, as read before the claim. Tasks the caller
+                # is still running are skipped, and due_by keeps a task stamped
+                # during this check from being claimed again in the same check.
+                await cursor.execute(f"""
+                    WITH due AS (
+                        SELECT t.id, t.last_run_at, s.schedule_interval
+                        FROM {self.TASKS_WITH_INTERVAL_SQL}
+                        WHERE t.is_active = true
+                          AND t.id <> ALL(%(exclude_ids)s)
+                          AND (
+                              t.last_run_at IS NULL
+                              OR (
+                                  -- schedule_interval is at least a minute, so tasks
+                                  -- run more recently can be skipped via the
+                                  -- idx_sched_active_lastrun index before parsing
+                                  t.last_run_at <= %(due_by)s - INTERVAL '1 minute'
+                                  AND t.last_run_at + s.schedule_interval <= %(due_by)s
+                              )
+                          )
+                        ORDER BY t.last_run_at NULLS FIRST
+                        LIMIT %(limit)s
+                        FOR UPDATE OF t SKIP LOCKED
                     )
-                    
-                    # Check if task is due for execution
-                    if self._is_task_due(task):
-                        tasks.append(task)
+                    UPDATE scheduled_tasks t
+                    SET last_run_at = NOW()
+                    FROM due
+                    WHERE t.id = due.id
+                    RETURNING t.id, t.user_id, t.task_name, t.query, t.data_structure, t.schedule, 
+                              due.last_run_at, t.is_active, t.created_at, t.updated_at,
+                              due.schedule_interval
+                """, {"limit": limit, "due_by": due_by, "exclude_ids": exclude_ids})
                 
-                return tasks
-        finally:
-            conn.close()
+                return await cursor.fetchall()
     
-    def _is_task_due(self, task: ScheduledTask) -> bool:
-        """Check if a task is due for execution based on its schedule"""
-        now = datetime.now(timezone.utc)
-        
-        # If never run before, it's due
-        if task.last_run_at is None:
-            return True
-        
-        # Ensure last_run_at is timezone-aware
-        last_run = task.last_run_at
-        if last_run.tzinfo is None:
-            # If naive, assume UTC
-            last_run = last_run.replace(tzinfo=timezone.utc)
-        
-        # Parse schedule (assuming format like "every 1 hour", "every 30 minutes", etc.)
-        schedule_text = task.schedule.lower()
-        
-        if "every" in schedule_text:
-            if "hour" in schedule_text:
-                # Extract number of hours
-                try:
-                    hours = int(''.join(filter(str.isdigit, schedule_text)))
-                    next_run = last_run + timedelta(hours=hours)
-                    return now >= next_run
-                except ValueError:
-                    # Default to 1 hour if parsing fails
-                    next_run = last_run + timedelta(hours=1)
-                    return now >= next_run
-            
-            elif "minute" in schedule_text:
-                # Extract number of minutes
-                try:
-                    minutes = int(''.join(filter(str.isdigit, schedule_text)))
-                    next_run = last_run + timedelta(minutes=minutes)
-                    return now >= next_run
-                except ValueError:
-                    # Default to 30 minutes if parsing fails
-                    next_run = last_run + timedelta(minutes=30)
-                    return now >= next_run
-            
-            elif "day" in schedule_text:
-                # Extract number of days
-                try:
-                    days = int(''.join(filter(str.isdigit, schedule_text)))
-                    next_run = last_run + timedelta(days=days)
-                    return now >= next_run
-                except ValueError:
-                    # Default to 1 day if parsing fails
-                    next_run = last_run + timedelta(days=1)
-                    return now >= next_run
-        
-        # Default: run every hour if schedule is unclear
-        next_run = last_run + timedelta(hours=1)
-        return now >= next_run
+    async def seconds_until_next_due(self) -> Optional[float]:
+        """Seconds until the next active task is due (<= 0 if one is due now), or None if there are none"""
+        async with self.pool.connection() as conn:
+            cursor = await conn.execute(f"""
+                SELECT EXTRACT(EPOCH FROM MIN(COALESCE(t.last_run_at + s.schedule_interval, NOW())) - NOW())
+                FROM {self.TASKS_WITH_INTERVAL_SQL}
+                WHERE t.is_active = true
+            """)
+            row = await cursor.fetchone()
+            return None if row[0] is None else float(row[0])
     
-    def update_last_run_time(self, task_id: str):
-        """Update the last_run_at timestamp for a task"""
-        conn = self.get_connection()
-        try:
-            with conn.cursor() as cursor:
-                cursor.execute("""
-                    UPDATE scheduled_tasks 
-                    SET last_run_at = NOW() 
-                    WHERE id = %s
-                """, (task_id,))
-                conn.commit()
-        finally:
-            conn.close()
+    async def listen(self) -> psycopg.AsyncConnection:
+        """Open a dedicated connection subscribed to task change notifications"""
+        conn = await psycopg.AsyncConnection.connect(self.conninfo, autocommit=True)
+        await conn.execute(f"LISTEN {self.NOTIFY_CHANNEL}")
+        return conn
+    
+    async def wait_for_changes(self, conn: psycopg.AsyncConnection, timeout: float) -> bool:
+        """Wait up to timeout seconds for a notification; return True if one arrived"""
+        notified = False
+        async for _ in conn.notifies(timeout=timeout, stop_after=1):
+            notified = True
+        return notified
 
 class BrowserUseAPI:
+    # How long to wait for a task to finish, and the longest gap between polls
+    POLL_TIMEOUT_SECONDS = 600
+    POLL_MAX_DELAY_SECONDS = 15
+    FIRST_POLL_DELAY_SECONDS = 0.25
+    # Bound each API request, so a hung socket can't eat the whole poll budget
+    REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=30, connect=10)
+    RATE_LIMIT_DEFAULT_DELAY_SECONDS = 5
+    
     def __init__(self, api_key: str):
         self.api_key = api_key
         self.base_url = "https://api.browser-use.com/api/v1"
+        # Request headers are the same for every call, so build them once
+        self.headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        # One HTTP session shared by every task so connections are reused
+        self._session: Optional[aiohttp.ClientSession] = None
+    
+    async def __aenter__(self) -> "BrowserUseAPI":
+        self._get_session()
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await close_with_timeout("Browser-Use HTTP session", self.close())
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared HTTP session, creating it on first use"""
+        if self._session is None or self._session.closed:
+            # Keep warm connections to the API and cache its DNS lookup, so
+            # starts and polls for every task reuse the same sockets. Idle
+            # connections must outlive the longest gap between polls, or each
+            # slow poll would pay for a new TCP+TLS handshake.
+            connector = aiohttp.TCPConnector(
+                limit=64,
+                ttl_dns_cache=300,
+                keepalive_timeout=self.POLL_MAX_DELAY_SECONDS * 2
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.REQUEST_TIMEOUT)
+        return self._session
+    
+    async def close(self):
+        """Close the shared HTTP session"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
     
     def clean_query(self, query: str) -> str:
         """Clean and escape the query like in Next.js project"""
@@ -162,211 +294,365 @@ class BrowserUseAPI:
     
     async def run_task(self, task: str, data_structure: Optional[str] = None, allowed_domains: Optional[List[str]] = None) -> str:
         """Run a task using Browser-Use Cloud API"""
-        async with aiohttp.ClientSession() as session:
-            # Clean the task query like in Next.js
-            clean_task = self.clean_query(task)
-            
-            # Prepare the request payload
-            payload = {
-                "task": clean_task,
-                "llm_model": "gpt-4.1-mini"
-            }
-            
-            # Add structured output if provided
-            # if data_structure:
-            #     # Format data structure like in Next.js: remove all whitespace and escape double quotes
-            #     formatted_data_structure = re.sub(r'\s', '', data_structure)
-            #     payload["structured_output_json"] = formatted_data_structure
+        session = self._get_session()
+        
+        # Clean the task query like in Next.js
+        clean_task = self.clean_query(task)
+        
+        # Prepare the request payload
+        payload = {
+            "task": clean_task,
+            "llm_model": "gpt-4.1-mini"
+        }
+        
+        # Add structured output if provided
+        # if data_structure:
+        #     # Format data structure like in Next.js: remove all whitespace and escape double quotes
+        #     formatted_data_structure = re.sub(r'\s', '', data_structure)
+        #     payload["structured_output_json"] = formatted_data_structure
+        
+        # Add allowed domains if provided
+        if allowed_domains:
+            payload["allowed_domains"] = allowed_domains
+        
+        # logger.info(f"🚀 Starting Browser-Use task: {clean_task[:100]}...")
+        # if data_structure:
+        #     logger.info(f"📋 Using structured output: {formatted_data_structure[:100]}...")
+        
+        # Start the task
+        async with session.post(
+            f"{self.base_url}/run-task",
+            headers=self.headers,
+            json=payload
+        ) as response:
+            if not response.ok:
+                error_text = await response.text()
+                raise Exception(f"Failed to start task: {response.status} - {error_text}")
             
-            # Add allowed domains if provided
-            if allowed_domains:
-                payload["allowed_domains"] = allowed_domains
+            result = await response.json()
+            task_id = result.get("id")
             
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
+            if not task_id:
+                detail = result.get("detail", "Unknown error")
+                raise Exception(f"Failed to get task ID: {detail}")
             
-            # print(f"🚀 Starting Browser-Use task: {clean_task[:100]}...")
-            # if data_structure:
-            #     print(f"📋 Using structured output: {formatted_data_structure[:100]}...")
+            logger.info(f"📋 Task started with ID: {task_id}")
+            logger.info(f"🔗 Task URL: https://api.browser-use.com/api/v1/task/{task_id}")
             
-            # Start the task
-            async with session.post(
-                f"{self.base_url}/run-task",
-                headers=headers,
-                json=payload
-            ) as response:
-                if not response.ok:
-                    error_text = await response.text()
-                    raise Exception(f"Failed to start task: {response.status} - {error_text}")
-                
-                result = await response.json()
-                task_id = result.get("id")
-                
-                if not task_id:
-                    detail = result.get("detail", "Unknown error")
-                    raise Exception(f"Failed to get task ID: {detail}")
-                
-                print(f"📋 Task started with ID: {task_id}")
-                print(f"🔗 Task URL: https://api.browser-use.com/api/v1/task/{task_id}")
-                
-                # Give the task a moment to initialize
-                print("⏳ Waiting 3 seconds for task to initialize...")
-                await asyncio.sleep(3)
-                
-                # Poll for task completion and wait for it to finish
-                print(f"🔄 Beginning to poll task {task_id} for completion...")
-                final_result = await self._poll_task_completion(session, task_id, headers)
-                print(f"🎉 Task {task_id} completed with result: {final_result[:200]}...")
-                return final_result
+            # Poll for task completion and wait for it to finish
+            logger.info(f"🔄 Beginning to poll task {task_id} for completion...")
+            final_result = await self._poll_task_completion(session, task_id)
+            logger.info(f"🎉 Task {task_id} completed with result: {final_result[:200]}...")
+            return final_result
+    
+    def _next_poll_delay(self, streak: int, deadline: float) -> float:
+        """Exponential backoff (1s, 2s, 4s, ... capped at POLL_MAX_DELAY_SECONDS) plus jitter, never past the deadline"""
+        delay = min(self.POLL_MAX_DELAY_SECONDS, 2 ** min(streak - 1, 4)) + random.uniform(0, 0.5)
+        return max(0.0, min(delay, deadline - asyncio.get_running_loop().time()))
     
-    async def _poll_task_completion(self, session: aiohttp.ClientSession, task_id: str, headers: dict) -> str:
+    def _retry_after_delay(self, response: aiohttp.ClientResponse, deadline: float) -> float:
+        """Seconds the API asked us to wait via Retry-After, never past the deadline"""
+        try:
+            delay = float(response.headers.get("Retry-After", self.RATE_LIMIT_DEFAULT_DELAY_SECONDS))
+        except ValueError:
+            # Retry-After may also be an HTTP date; fall back to the default
+            delay = self.RATE_LIMIT_DEFAULT_DELAY_SECONDS
+        return max(0.0, min(delay, deadline - asyncio.get_running_loop().time()))
+    
+    async def _poll_task_completion(self, session: aiohttp.ClientSession, task_id: str) -> str:
         """Poll for task completion and return results"""
-        max_attempts = 120  # 10 minutes with 5-second intervals
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.POLL_TIMEOUT_SECONDS
         attempt = 0
+        # Consecutive "still running" polls and consecutive failed polls back
+        # off on separate ladders, so a transient error doesn't slow polling
+        running_streak = 0
+        error_streak = 0
+        
+        logger.info(f"🔄 Starting to poll task {task_id} for completion...")
         
-        print(f"🔄 Starting to poll task {task_id} for completion...")
+        # A brief pause instead of a fixed startup wait: tasks that start
+        # quickly are seen at once, slower ones fall into the backoff below
+        await asyncio.sleep(self.FIRST_POLL_DELAY_SECONDS)
         
-        while attempt < max_attempts:
+        while loop.time() < deadline:
+            attempt += 1
             try:
-                print(f"📡 Polling attempt {attempt + 1}/{max_attempts} for task {task_id}...")
+                logger.debug("📡 Polling attempt %d for task %s...", attempt, task_id)
                 
                 async with session.get(
                     f"{self.base_url}/task/{task_id}",
-                    headers=headers
+                    headers=self.headers
                 ) as response:
                     if not response.ok:
                         error_text = await response.text()
-                        print(f"⚠️  Error checking task status: {response.status} - {error_text}")
-                        await asyncio.sleep(5)
-                        attempt += 1
+                        # Client errors such as a bad key or an unknown task
+                        # won't fix themselves, so fail now instead of
+                        # retrying until the deadline
+                        if response.status < 500 and response.status != 429:
+                            raise Exception(f"Failed to check task status: {response.status} - {error_text}")
+                        error_streak += 1
+                        delay = self._next_poll_delay(error_streak, deadline)
+                        if response.status == 429:
+                            # Honour Retry-After, but never retry faster than
+                            # the error backoff (e.g. on "Retry-After: 0")
+                            delay = max(delay, self._retry_after_delay(response, deadline))
+                        logger.warning(f"⚠️  Error checking task status: {response.status} - {error_text}")
+                        await asyncio.sleep(delay)
                         continue
                     
                     task_data = await response.json()
-                    status = task_data.get("status")
-                    output = task_data.get("output", "")
-                    
-                    print(f"📊 Task {task_id} status: {status} (attempt {attempt + 1}/{max_attempts})")
-                    
-                    # Check for completion statuses
-                    if status == "finished":
-                        result = output if output else "Task completed successfully"
-                        print(f"✅ Task {task_id} finished successfully")
-                        print(f"📄 Task output: {result[:500]}...")
-                        return str(result)
-                    
-                    elif status == "failed":
-                        error = task_data.get("error", "Unknown error")
-                        print(f"❌ Task {task_id} failed: {error}")
-                        raise Exception(f"Task failed: {error}")
-                    
-                    elif status == "stopped":
-                        result = output if output else "Task was stopped"
-                        print(f"⏹️  Task {task_id} was stopped")
-                        print(f"📄 Task output: {result[:500]}...")
-                        return str(result)
-                    
-                    elif status in ["running", "pending", "queued"]:
-                        # Task is still running, wait and check again
-                        print(f"⏳ Task {task_id} is {status}, waiting 5 seconds...")
-                        await asyncio.sleep(5)
-                        attempt += 1
-                        continue
+                
+                error_streak = 0
+                status = task_data.get("status")
+                output = task_data.get("output", "")
+                
+                logger.debug("📊 Task %s status: %s (attempt %d)", task_id, status, attempt)
+                
+                # Check for completion statuses
+                if status == "finished":
+                    result = output if output else "Task completed successfully"
+                    logger.info(f"✅ Task {task_id} finished successfully")
+                    logger.info(f"📄 Task output: {result[:500]}...")
+                    return str(result)
+                
+                elif status == "failed":
+                    error = task_data.get("error", "Unknown error")
+                    logger.error(f"❌ Task {task_id} failed: {error}")
+                    raise Exception(f"Task failed: {error}")
+                
+                elif status == "stopped":
+                    result = output if output else "Task was stopped"
+                    logger.info(f"⏹️  Task {task_id} was stopped")
+                    logger.info(f"📄 Task output: {result[:500]}...")
+                    return str(result)
+                
+                elif status in ["running", "pending", "queued"]:
+                    # Task is still running, wait and check again
+                    running_streak += 1
+                    delay = self._next_poll_delay(running_streak, deadline)
+                    logger.debug("⏳ Task %s is %s, waiting %.1f seconds...", task_id, status, delay)
+                    await asyncio.sleep(delay)
+                
+                else:
+                    running_streak += 1
+                    delay = self._next_poll_delay(running_streak, deadline)
+                    logger.warning(f"⚠️  Unknown status '{status}' for task {task_id}")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("📄 Full response: %s", task_data)
+                    await asyncio.sleep(delay)
                     
-                    else:
-                        print(f"⚠️  Unknown status '{status}' for task {task_id}")
-                        print(f"📄 Full response: {task_data}")
-                        await asyncio.sleep(5)
-                        attempt += 1
-                        continue
-                        
-            except Exception as e:
-                print(f"⚠️  Error polling task status: {e}")
-                await asyncio.sleep(5)
-                attempt += 1
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                # Only transport and response-parsing errors are retried; a
+                # "failed" status raised above propagates to the caller
+                error_streak += 1
+                logger.warning(f"⚠️  Error polling task status: {e}")
+                await asyncio.sleep(self._next_poll_delay(error_streak, deadline))
         
-        print(f"⏰ Task {task_id} timed out after {max_attempts * 5} seconds (10 minutes)")
-        raise Exception(f"Task {task_id} timed out after {max_attempts * 5} seconds (10 minutes)")
+        logger.error(f"⏰ Task {task_id} timed out after {self.POLL_TIMEOUT_SECONDS} seconds")
+        raise Exception(f"Task {task_id} timed out after {self.POLL_TIMEOUT_SECONDS} seconds")
 
-async def execute_scheduled_task(task: ScheduledTask, db_manager: DatabaseManager):
-    """Execute a single scheduled task using Browser-Use Cloud API"""
-    print(f"🔄 Executing task: {task.task_name} (ID: {task.id})")
-    print(f"📝 Task query: {task.query}")
+async def close_with_timeout(name: str, closing: Awaitable):
+    """Await a close call, giving up after SHUTDOWN_TIMEOUT_SECONDS so a hung resource can't stall shutdown"""
+    try:
+        await asyncio.wait_for(closing, timeout=SHUTDOWN_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.warning(f"⚠️  Timed out closing {name} after {SHUTDOWN_TIMEOUT_SECONDS} seconds")
+    except Exception as e:
+        logger.warning(f"⚠️  Error closing {name}: {e}")
+
+async def execute_scheduled_task(task: ScheduledTask, browser_use: BrowserUseAPI) -> bool:
+    """Execute a single scheduled task using Browser-Use Cloud API; return whether it succeeded"""
+    logger.info(f"🔄 Executing task: {task.task_name} (ID: {task.id}, every {task.schedule_interval})")
+    logger.info(f"📝 Task query: {task.query}")
     
     try:
-        # Initialize Browser-Use API
-        api_key = os.environ.get("BROWSER_USE_API_KEY")
-        if not api_key:
-            raise Exception("BROWSER_USE_API_KEY environment variable not set")
-        
-        browser_use = BrowserUseAPI(api_key)
-        
         # Execute the task
         result = await browser_use.run_task(
             task=task.query,
             data_structure=task.data_structure
         )
         
-        print(f"✅ Task '{task.task_name}' completed successfully")
-        print(f"📊 Result: {result}")
-        
-        # Update last run time in database
-        db_manager.update_last_run_time(task.id)
-        print(f"📅 Updated last_run_at for task {task.id}")
+        logger.info(f"✅ Task '{task.task_name}' completed successfully")
+        logger.info(f"📊 Result: {result}")
+        return True
         
     except Exception as e:
-        print(f"❌ Failed to execute task '{task.task_name}': {e}")
-        # Still update last run time to prevent infinite retries
-        db_manager.update_last_run_time(task.id)
-        print(f"📅 Updated last_run_at for task {task.id} despite failure")
+        logger.error(f"❌ Failed to execute task '{task.task_name}': {e}")
+        return False
 
-async def check_and_execute_tasks():
-    """Main function to check for due tasks and execute them"""
-    print(f"🕐 Checking for scheduled tasks at {datetime.now(timezone.utc)}")
+async def run_due_tasks(db_manager: DatabaseManager, browser_use: BrowserUseAPI):
+    """Check for due tasks and execute them, claiming more as execution slots free up"""
+    logger.info(f"🕐 Checking for scheduled tasks at {datetime.now(timezone.utc)}")
     
-    # Initialize database manager
-    database_url = os.environ.get("DATABASE_URL")
-    if not database_url:
-        print("❌ DATABASE_URL environment variable not set")
+    # Only as many tasks are claimed as can start right away, so last_run_at
+    # is stamped when a task actually starts. Claiming ahead would leave tasks
+    # stamped but queued, open to being claimed again by another runner once
+    # their interval passed, and lost until their next run on a crash.
+    # Every claim in this check only takes tasks that were due when it began,
+    # so a one-shot run ends even while short-interval tasks keep falling due.
+    try:
+        check_started_at = await db_manager.current_time()
+    except Exception as e:
+        logger.error(f"❌ Error checking/executing tasks: {e}")
         return
     
-    db_manager = DatabaseManager(database_url)
+    running: Dict[asyncio.Task, ScheduledTask] = {}
+    claimed = 0
+    succeeded = 0
+    exhausted = False
+    claim_failed = False
     
-    try:
-        # Get tasks that are due for execution
-        due_tasks = db_manager.get_tasks_due_for_execution()
-        
-        if not due_tasks:
-            print("ℹ️  No tasks due for execution")
-            return
+    while True:
+        free_slots = MAX_PARALLEL_TASKS - len(running)
+        if not exhausted and free_slots > 0:
+            try:
+                # Claim tasks that are due for execution; this also sets their last_run_at
+                due_tasks = await db_manager.claim_due_tasks(
+                    free_slots, check_started_at, [task.id for task in running.values()]
+                )
+            except Exception as e:
+                logger.error(f"❌ Error checking/executing tasks: {e}")
+                due_tasks = []
+                claim_failed = True
+            
+            # A short claim means every task due when the check began has
+            # been taken; tasks that fall due later are left for the next check
+            if claim_failed or len(due_tasks) < free_slots:
+                exhausted = True
+            if due_tasks:
+                logger.info(f"📋 Claimed {len(due_tasks)} task(s) due for execution")
+            for task in due_tasks:
+                running[asyncio.create_task(execute_scheduled_task(task, browser_use))] = task
+            claimed += len(due_tasks)
         
-        print(f"📋 Found {len(due_tasks)} task(s) due for execution")
+        if not running:
+            break
         
-        # Execute each due task
-        for task in due_tasks:
-            await execute_scheduled_task(task, db_manager)
+        done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        for future in done:
+            task = running.pop(future)
+            error = future.exception()
+            if error is not None:
+                logger.error(f"❌ Unexpected error in task '{task.task_name}': {error}")
+            elif future.result():
+                succeeded += 1
+    
+    if claimed:
+        logger.info(f"🏁 {succeeded}/{claimed} task(s) succeeded")
+    elif not claim_failed:
+        logger.info("ℹ️  No tasks due for execution")
+
+async def run_scheduler_loop(db_manager: DatabaseManager, browser_use: BrowserUseAPI):
+    """Run due tasks forever, sleeping until the next task is due or the table changes"""
+    listener = None
+    try:
+        while True:
+            try:
+                if listener is None or listener.closed or listener.broken:
+                    listener = await db_manager.listen()
+                
+                await run_due_tasks(db_manager, browser_use)
+                
+                delay = await db_manager.seconds_until_next_due()
+                if delay is None:
+                    timeout = DAEMON_MAX_IDLE_SECONDS
+                else:
+                    timeout = min(max(delay, 1), DAEMON_MAX_IDLE_SECONDS)
+                
+                logger.info(f"💤 Sleeping up to {timeout:.0f}s until the next task is due")
+                if await db_manager.wait_for_changes(listener, timeout):
+                    logger.info("🔔 Scheduled tasks changed, checking again")
             
-    except Exception as e:
-        print(f"❌ Error checking/executing tasks: {e}")
+            except psycopg.Error as e:
+                logger.warning(f"⚠️  Database error in scheduler loop: {e}")
+                await asyncio.sleep(DAEMON_RETRY_SECONDS)
+    finally:
+        if listener is not None:
+            await close_with_timeout("notification listener", listener.close())
 
-def main():
-    """Main entry point for the script"""
-    print("🚀 Starting Cron Fetch Browser Task Runner")
-    print(f"⏰ Started at: {datetime.now(timezone.utc)}")
+async def check_and_execute_tasks():
+    """Main function to check for due tasks and execute them"""
+    # Initialize database manager
+    if not DATABASE_URL:
+        logger.error("❌ DATABASE_URL environment variable not set")
+        return
     
-    # Check if required environment variables are set
-    required_env_vars = ["DATABASE_URL", "BROWSER_USE_API_KEY"]
-    missing_vars = [var for var in required_env_vars if not os.environ.get(var)]
+    if not BROWSER_USE_API_KEY:
+        logger.error("❌ BROWSER_USE_API_KEY environment variable not set")
+        return
     
-    if missing_vars:
-        print(f"❌ Missing required environment variables: {missing_vars}")
+    db_manager = DatabaseManager(DATABASE_URL)
+    try:
+        await db_manager.open()
+    except psycopg.Error as e:
+        logger.error(f"❌ Failed to connect to database: {e}")
+        await close_with_timeout("database pool", db_manager.close())
         return
     
-    # Run the task checker once
-    asyncio.run(check_and_execute_tasks())
+    try:
+        # Shared by all tasks so HTTP connections are reused
+        async with BrowserUseAPI(BROWSER_USE_API_KEY) as browser_use:
+            if os.environ.get("DAEMON_MODE", "").lower() in ("1", "true", "yes"):
+                logger.info("🔁 Running as a daemon, waiting for tasks to become due")
+                await run_scheduler_loop(db_manager, browser_use)
+            else:
+                await run_due_tasks(db_manager, browser_use)
+    finally:
+        await close_with_timeout("database pool", db_manager.close())
+
+def setup_logging() -> QueueListener:
+    """Route log records through a queue so concurrent tasks never block on stdout"""
+    log_queue = queue.SimpleQueue()
+    logging.basicConfig(
+        level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s %(levelname)s %(message)s",
+        handlers=[QueueHandler(log_queue)]
+    )
+    # psycopg_pool logs every connection checkout at INFO
+    logging.getLogger("psycopg.pool").setLevel(logging.WARNING)
     
-    print(f"✅ Task runner completed at: {datetime.now(timezone.utc)}")
+    listener = QueueListener(log_queue, logging.StreamHandler(sys.stdout))
+    listener.start()
+    return listener
+
+def main():
+    """Main entry point for the script"""
+    log_listener = setup_logging()
+    try:
+        logger.info("🚀 Starting Cron Fetch Browser Task Runner")
+        logger.info(f"⏰ Started at: {datetime.now(timezone.utc)}")
+        
+        # Check if required environment variables are set
+        required_env_vars = {"DATABASE_URL": DATABASE_URL, "BROWSER_USE_API_KEY": BROWSER_USE_API_KEY}
+        missing_vars = [var for var, value in required_env_vars.items() if not value]
+        
+        if missing_vars:
+            logger.error(f"❌ Missing required environment variables: {missing_vars}")
+            return
+        
+        # Checked before anything is claimed: a bad cap would stamp due tasks
+        # as run and then fail or hang before executing them
+        if MAX_PARALLEL_TASKS is None:
+            logger.error(f"❌ MAX_PARALLEL_TASKS must be a positive integer, got {MAX_PARALLEL_TASKS_SETTING!r}")
+            return
+        
+        if DB_POOL_MAX is None:
+            logger.error(f"❌ DB_POOL_MAX must be a positive integer, got {DB_POOL_MAX_SETTING!r}")
+            return
+        
+        if DB_PREPARE_THRESHOLD is None and not DB_PREPARE_THRESHOLD_OFF:
+            logger.error(f"❌ DB_PREPARE_THRESHOLD must be a non-negative integer or 'off', got {DB_PREPARE_THRESHOLD_SETTING!r}")
+            return
+        
+        # Run the task checker once (or forever with DAEMON_MODE)
+        run = uvloop.run if uvloop is not None else asyncio.run
+        run(check_and_execute_tasks())
+        
+        logger.info(f"✅ Task runner completed at: {datetime.now(timezone.utc)}")
+    finally:
+        # Flush any queued log records before exiting
+        log_listener.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,14 @@
+-- Wake runners started with DAEMON_MODE=true as soon as a task is added,
+-- (de)activated or rescheduled. The runner's own last_run_at updates do not
+-- notify, so they don't wake it up again.
+CREATE OR REPLACE FUNCTION notify_scheduled_tasks_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('scheduled_tasks_changed', NEW.id::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS scheduled_tasks_changed ON scheduled_tasks;
+CREATE TRIGGER scheduled_tasks_changed
+    AFTER INSERT OR UPDATE OF schedule, is_active ON scheduled_tasks
+    FOR EACH ROW EXECUTE FUNCTION notify_scheduled_tasks_changed();
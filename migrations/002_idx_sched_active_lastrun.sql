@@ -0,0 +1,6 @@
+-- Partial index over active tasks only, so the due-task scan skips inactive
+-- rows and reads last_run_at straight from the index.
+-- CONCURRENTLY cannot run inside a transaction; run this file with plain psql.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sched_active_lastrun
+    ON scheduled_tasks (last_run_at)
+    WHERE is_active;
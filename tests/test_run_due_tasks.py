@@ -0,0 +1,98 @@
+import asyncio
+import unittest
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+from uuid import uuid4
+
+import main
+
+# Simulated seconds per real second, so minute-long schedules run in milliseconds
+TIME_SCALE = 600
+
+
+class FakeDatabase:
+    """Applies the claim_due_tasks SQL rules to in-memory tasks on a scaled clock"""
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.started = asyncio.get_running_loop().time()
+        self.base = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        self.claims = []
+
+    def now(self) -> datetime:
+        elapsed = asyncio.get_running_loop().time() - self.started
+        return self.base + timedelta(seconds=elapsed * TIME_SCALE)
+
+    async def current_time(self) -> datetime:
+        return self.now()
+
+    async def claim_due_tasks(self, limit, due_by, exclude_ids):
+        self.claims.append((due_by, set(exclude_ids)))
+        due = [
+            task for task in self.tasks
+            if task.is_active
+            and task.id not in exclude_ids
+            and (
+                task.last_run_at is None
+                or (
+                    task.last_run_at <= due_by - timedelta(minutes=1)
+                    and task.last_run_at + task.schedule_interval <= due_by
+                )
+            )
+        ]
+        due.sort(key=lambda task: (task.last_run_at is not None, task.last_run_at or self.base))
+        claimed = due[:limit]
+        now = self.now()
+        for task in claimed:
+            self.tasks[self.tasks.index(task)] = replace(task, last_run_at=now)
+        return claimed
+
+
+def make_task(name: str, last_run_at: datetime) -> main.ScheduledTask:
+    return main.ScheduledTask(
+        id=uuid4(), user_id="user", task_name=name, query="query", data_structure=None,
+        schedule="every 1 minute", last_run_at=last_run_at, is_active=True,
+        created_at=last_run_at, updated_at=last_run_at, schedule_interval=timedelta(minutes=1)
+    )
+
+
+class RunDueTasksTest(unittest.IsolatedAsyncioTestCase):
+    async def run_check(self):
+        """Four every-minute tasks on two slots, one of which runs for five minutes"""
+        self.db = FakeDatabase([])
+        long_ago = self.db.base - timedelta(hours=1)
+        self.db.tasks = [make_task(name, long_ago) for name in ("slow", "a", "b", "c")]
+        self.running = set()
+        self.overlaps = []
+        self.runs = []
+
+        async def fake_execute(task, browser_use):
+            if task.id in self.running:
+                self.overlaps.append(task.task_name)
+            self.running.add(task.id)
+            self.runs.append(task.task_name)
+            minutes = 5 if task.task_name == "slow" else 1.5
+            await asyncio.sleep(minutes * 60 / TIME_SCALE)
+            self.running.discard(task.id)
+            return True
+
+        with mock.patch.object(main, "MAX_PARALLEL_TASKS", 2), \
+                mock.patch.object(main, "execute_scheduled_task", fake_execute):
+            await asyncio.wait_for(main.run_due_tasks(self.db, browser_use=None), timeout=5)
+
+    async def test_running_tasks_are_not_claimed_again(self):
+        await self.run_check()
+        self.assertEqual(self.overlaps, [])
+        running_at_claim = [exclude_ids for _, exclude_ids in self.db.claims]
+        slow = next(task.id for task in self.db.tasks if task.task_name == "slow")
+        self.assertTrue(all(slow in exclude_ids for exclude_ids in running_at_claim[1:]))
+
+    async def test_check_claims_only_tasks_due_when_it_began(self):
+        await self.run_check()
+        self.assertEqual(sorted(self.runs), ["a", "b", "c", "slow"])
+        self.assertEqual(len({due_by for due_by, _ in self.db.claims}), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()